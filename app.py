@@ -1,19 +1,97 @@
-from flask import Flask, request, jsonify, g
-from werkzeug.middleware.proxy_fix import ProxyFix
-import threading
+from quart import Quart, Response, request, g
+import aiohttp
+from hypercorn.middleware import ProxyFixMiddleware
+import asyncio
 import logging
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from logging.handlers import (
+    RotatingFileHandler, TimedRotatingFileHandler, MemoryHandler,
+    QueueHandler, QueueListener)
+import threading
+import queue
+import atexit
 import time
-from datetime import datetime
-import uuid
-import json
-from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+import orjson
+from dataclasses import dataclass
 from typing import Dict, Optional, List
-import queue
 from functools import wraps
 import os
+import uvicorn
+
+from fastuuid import new_uuid_str
+
+# None of the log formats use thread or process details, so skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+_ACCESS = logging.getLogger('access')
+_ERROR = logging.getLogger('error')
+_LOG_DATEFMT = '%Y-%m-%dT%H:%M:%S'
+
+# Connection-level headers that must not be forwarded by a proxy (RFC 7230 6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade'
+})
+REQUEST_SKIP_HEADERS = HOP_BY_HOP_HEADERS | {'host'}
+# aiohttp decodes upstream bodies, so their framing headers no longer match
+RESPONSE_SKIP_HEADERS = HOP_BY_HOP_HEADERS | {'content-length', 'content-encoding'}
+
+def _json(obj, status: int = 200) -> Response:
+    """Serialize obj with orjson into a JSON response"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the formatted asctime for records in the same second"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_time = (None, '')
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if self._cached_time[0] != second:
+            self._cached_time = (second, super().formatTime(record, datefmt))
+        return self._cached_time[1]
 
-@dataclass
+class FastRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that counts the bytes it writes instead of seeking
+    to the end of the file on every record to decide when to roll over.
+
+    As documented for RotatingFileHandler, no rollover happens when either
+    maxBytes or backupCount is zero."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bytes_written = (
+            os.path.getsize(self.baseFilename)
+            if os.path.exists(self.baseFilename) else 0
+        )
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # Measure with the stream's own codec; self.encoding may be 'locale'
+            size = (len(msg) if msg.isascii()
+                    else len(msg.encode(self.stream.encoding, 'replace')))
+            if (self.maxBytes > 0 and self.backupCount > 0 and self._bytes_written
+                    and self._bytes_written + size >= self.maxBytes):
+                self.doRollover()
+                self._bytes_written = 0
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self.flush()
+            self._bytes_written += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+@dataclass(slots=True)
 class Connection:
     id: str
     client_ip: str
@@ -22,79 +100,75 @@ class Connection:
     method: str
     user_agent: str
     request_id: str
-    headers: Dict
     rate_limit_remaining: int
 
 class ConnectionManager:
+    __slots__ = ('max_concurrent', 'connections', '_sem', '_total_requests',
+                 '_queued', '_rejected', '_total_response_time')
+
     def __init__(self, max_concurrent: int = 100):
         self.max_concurrent = max_concurrent
         self.connections: Dict[str, Connection] = {}
-        self.lock = threading.Lock()
-        self.connection_queue = queue.Queue()
-        self._initialize_metrics()
-        
-    def _initialize_metrics(self):
-        self.metrics = {
-            'total_requests': 0,
-            'active_connections': 0,
-            'queued_connections': 0,
-            'rejected_connections': 0,
-            'avg_response_time': 0,
-            'total_response_time': 0
-        }
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._total_requests = 0
+        self._queued = 0
+        self._rejected = 0
+        self._total_response_time = 0.0
     
-    def start_connection(self, timeout: int = 30) -> Optional[str]:
-        """Attempt to start a new connection"""
-        conn_id = str(uuid.uuid4())
-        
-        with self.lock:
-            if len(self.connections) >= self.max_concurrent:
-                try:
-                    # Try to queue the connection
-                    self.connection_queue.put(conn_id, timeout=timeout)
-                    self.metrics['queued_connections'] += 1
-                except queue.Full:
-                    self.metrics['rejected_connections'] += 1
-                    return None
-            
-            # Create new connection
-            self.connections[conn_id] = Connection(
-                id=conn_id,
-                client_ip=request.remote_addr,
-                start_time=time.time(),
-                endpoint=request.path,
-                method=request.method,
-                user_agent=request.headers.get('User-Agent', 'unknown'),
-                request_id=request.headers.get('X-Request-ID', str(uuid.uuid4())),
-                headers=dict(request.headers),
-                rate_limit_remaining=100  # Default rate limit
-            )
-            
-            self.metrics['total_requests'] += 1
-            self.metrics['active_connections'] = len(self.connections)
-            return conn_id
+    async def start_connection(self, timeout: int = 30) -> Optional[str]:
+        """Attempt to start a new connection, waiting up to `timeout` seconds for a free slot"""
+        # Semaphore waiters replace the explicit connection queue; only the
+        # contended path pays for a timeout task and queue bookkeeping
+        if not self._sem.locked():
+            await self._sem.acquire()
+        else:
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self._rejected += 1
+                return None
+            finally:
+                self._queued -= 1
+        
+        # Ids are only minted once a slot is held, so rejections allocate nothing
+        conn_id = new_uuid_str()
+        request_id = request.headers.get('X-Request-ID')
+        if request_id is None:
+            request_id = new_uuid_str()
+        
+        # Create new connection
+        conn = Connection(
+            id=conn_id,
+            client_ip=request.remote_addr,
+            start_time=time.monotonic(),
+            endpoint=request.path,
+            method=request.method,
+            user_agent=request.headers.get('User-Agent', 'unknown'),
+            request_id=request_id,
+            rate_limit_remaining=100  # Default rate limit
+        )
+        
+        # No await between here and return, so the event loop keeps this atomic
+        self.connections[conn_id] = conn
+        self._total_requests += 1
+        return conn_id
     
-    def end_connection(self, conn_id: str) -> None:
-        """End a connection and update metrics"""
-        with self.lock:
-            if conn_id in self.connections:
-                conn = self.connections[conn_id]
-                duration = time.time() - conn.start_time
-                self.metrics['total_response_time'] += duration
-                self.metrics['avg_response_time'] = (
-                    self.metrics['total_response_time'] / self.metrics['total_requests']
-                )
-                del self.connections[conn_id]
-                
-                # Process queued connection if any
-                try:
-                    queued_conn_id = self.connection_queue.get_nowait()
-                    self.metrics['queued_connections'] -= 1
-                    self.start_connection(queued_conn_id)
-                except queue.Empty:
-                    pass
-                
-                self.metrics['active_connections'] = len(self.connections)
+    async def end_connection(self, conn_id: str) -> None:
+        """End a connection, update metrics and free its slot"""
+        conn = self.connections.pop(conn_id, None)
+        if conn is None:
+            return
+        duration = time.monotonic() - conn.start_time
+        self._total_response_time += duration
+        
+        # Wakes the oldest waiter in start_connection, if any
+        self._sem.release()
+
+    @property
+    def queued_connections(self) -> int:
+        """Number of requests currently waiting for a free slot"""
+        return self._queued
 
     def get_connection(self, conn_id: str) -> Optional[Connection]:
         """Get connection details"""
@@ -102,13 +176,23 @@ class ConnectionManager:
 
     def get_metrics(self) -> Dict:
         """Get current metrics"""
-        with self.lock:
-            return dict(self.metrics)
+        return {
+            'total_requests': self._total_requests,
+            'active_connections': len(self.connections),
+            'queued_connections': self._queued,
+            'rejected_connections': self._rejected,
+            'total_response_time': self._total_response_time,
+            'avg_response_time': (
+                self._total_response_time / self._total_requests
+                if self._total_requests else 0
+            )
+        }
 
-class APIGateway(Flask):
+class APIGateway(Quart):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.connection_manager = ConnectionManager(max_concurrent=100)
+        self._health_cache = (0.0, b'')
         self.setup_logging()
         self.setup_middleware()
         self.setup_error_handlers()
@@ -119,126 +203,220 @@ class APIGateway(Flask):
             os.makedirs('logs')
             
         # Application logger
-        app_handler = RotatingFileHandler(
+        app_handler = FastRotatingFileHandler(
             'logs/app.log', maxBytes=10485760, backupCount=10)
-        app_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s [%(request_id)s] %(message)s'
+        app_handler.setFormatter(CachedTimeFormatter(
+            '%(asctime)s %(levelname)s [%(request_id)s] %(message)s',
+            datefmt=_LOG_DATEFMT
         ))
-        self.logger.addHandler(app_handler)
         self.logger.setLevel(logging.INFO)
         
         # Access logger
-        access_logger = logging.getLogger('access')
         access_handler = TimedRotatingFileHandler(
             'logs/access.log', when='midnight', interval=1, backupCount=30)
-        access_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(message)s'
+        access_handler.setFormatter(CachedTimeFormatter(
+            '%(asctime)s %(message)s', datefmt=_LOG_DATEFMT
         ))
-        access_logger.addHandler(access_handler)
-        access_logger.setLevel(logging.INFO)
+        _ACCESS.setLevel(logging.INFO)
         
         # Error logger
-        error_logger = logging.getLogger('error')
-        error_handler = RotatingFileHandler(
+        error_handler = FastRotatingFileHandler(
             'logs/error.log', maxBytes=10485760, backupCount=10)
-        error_handler.setFormatter(logging.Formatter(
+        error_handler.setFormatter(CachedTimeFormatter(
             '%(asctime)s %(levelname)s [%(request_id)s] %(message)s\n'
             'Path: %(path)s\n'
             'Method: %(method)s\n'
             'Client IP: %(client_ip)s\n'
-            'Error: %(error)s\n'
-            'Traceback: %(traceback)s\n'
+            'Error: %(error)s\n',
+            datefmt=_LOG_DATEFMT
         ))
-        error_logger.addHandler(error_handler)
-        error_logger.setLevel(logging.ERROR)
+        _ERROR.setLevel(logging.ERROR)
+        
+        # Records are buffered in memory and written in batches, either when
+        # the buffer fills, on the periodic flush, or at once for errors
+        self.log_buffers = []
+        for name, handler in ((self.logger.name, app_handler),
+                              ('access', access_handler),
+                              ('error', error_handler)):
+            buffered = MemoryHandler(
+                1024, flushLevel=logging.ERROR, target=handler)
+            buffered.setLevel(logging.INFO)
+            buffered.addFilter(logging.Filter(name))
+            self.log_buffers.append(buffered)
+        
+        # Request handlers only enqueue records; a background listener
+        # thread owns the file handlers and does the disk I/O
+        log_queue = queue.Queue(-1)
+        queue_handler = QueueHandler(log_queue)
+        for logger in (self.logger, _ACCESS, _ERROR):
+            logger.addHandler(queue_handler)
+        self.log_listener = QueueListener(
+            log_queue, *self.log_buffers, respect_handler_level=True)
+        self.log_listener.start()
+        
+        self.log_flush_stop = threading.Event()
+        threading.Thread(
+            target=self.flush_logs, name='log-flush', daemon=True).start()
+        atexit.register(self.shutdown_logging)
+        
+        @self.after_serving
+        async def stop_logging():
+            # Uvicorn re-raises SIGTERM after shutdown, so atexit may never run
+            self.shutdown_logging()
+        
+    def flush_logs(self, interval: float = 1.0):
+        """Flush buffered log records every `interval` seconds until shutdown"""
+        while not self.log_flush_stop.wait(interval):
+            for buffered in self.log_buffers:
+                buffered.flush()
+    
+    def shutdown_logging(self):
+        """Drain the log queue and write out any buffered records"""
+        if self.log_flush_stop.is_set():
+            return
+        self.log_flush_stop.set()
+        self.log_listener.stop()
+        for buffered in self.log_buffers:
+            buffered.flush()
         
     def setup_middleware(self):
         """Configure middleware"""
-        self.wsgi_app = ProxyFix(self.wsgi_app)
+        self.asgi_app = ProxyFixMiddleware(self.asgi_app)
         
     def setup_error_handlers(self):
         """Configure error handlers"""
         @self.errorhandler(Exception)
-        def handle_exception(e):
-            error_logger = logging.getLogger('error')
-            error_logger.exception(
+        async def handle_exception(e):
+            request_id = getattr(g, 'request_id', 'unknown')
+            _ERROR.exception(
                 "Unhandled exception",
                 extra={
-                    'request_id': getattr(g, 'request_id', 'unknown'),
+                    'request_id': request_id,
                     'path': request.path,
                     'method': request.method,
                     'client_ip': request.remote_addr,
-                    'error': str(e),
-                    'traceback': traceback.format_exc()
+                    'error': str(e)
                 }
             )
-            return jsonify({
+            return _json({
                 'error': 'Internal Server Error',
-                'request_id': getattr(g, 'request_id', 'unknown')
-            }), 500
+                'request_id': request_id
+            }, 500)
 
 def create_app():
     app = APIGateway(__name__)
+    app.config['UPSTREAM_URL'] = os.environ.get('UPSTREAM_URL')
+    app.config['UPSTREAM_TIMEOUT'] = float(os.environ.get('UPSTREAM_TIMEOUT', 30))
     
     def require_connection(f):
         @wraps(f)
-        def decorated_function(*args, **kwargs):
-            conn_id = app.connection_manager.start_connection()
+        async def decorated_function(*args, **kwargs):
+            conn_id = await app.connection_manager.start_connection()
             if not conn_id:
-                return jsonify({
+                return _json({
                     'error': 'Server is busy. Please try again later.',
-                    'queued': app.connection_manager.metrics['queued_connections']
-                }), 503
+                    'queued': app.connection_manager.queued_connections
+                }, 503)
             
             try:
                 g.conn_id = conn_id
                 g.request_id = app.connection_manager.get_connection(conn_id).request_id
-                return f(*args, **kwargs)
+                return await f(*args, **kwargs)
             finally:
-                app.connection_manager.end_connection(conn_id)
+                await app.connection_manager.end_connection(conn_id)
         return decorated_function
     
     @app.before_request
-    def before_request():
-        g.request_start_time = time.time()
+    async def before_request():
+        g.request_start_time = time.monotonic()
+        g.request_id = 'unknown'
         
     @app.after_request
-    def after_request(response):
-        if hasattr(g, 'request_start_time'):
-            duration = time.time() - g.request_start_time
-            access_logger = logging.getLogger('access')
-            access_logger.info(
-                f'{request.remote_addr} "{request.method} {request.path}" '
-                f'{response.status_code} {duration:.3f}s '
-                f'[{getattr(g, "request_id", "unknown")}]'
-            )
+    async def after_request(response):
+        # before_request always sets both request_start_time and request_id
+        duration = time.monotonic() - g.request_start_time
+        _ACCESS.info(
+            '%s "%s %s" %d %.3fs [%s]',
+            request.remote_addr, request.method, request.path,
+            response.status_code, duration, g.request_id
+        )
         return response
     
     @app.route('/health')
-    def health_check():
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat()
-        })
+    async def health_check():
+        # Load balancers poll this often, so the body is rebuilt at most once a second
+        now = time.time()
+        if now - app._health_cache[0] > 1.0:
+            body = orjson.dumps({
+                'status': 'healthy',
+                'timestamp': datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None).isoformat()
+            })
+            app._health_cache = (now, body)
+        return Response(app._health_cache[1], mimetype='application/json')
     
     @app.route('/metrics')
-    def metrics():
-        return jsonify(app.connection_manager.get_metrics())
+    async def metrics():
+        return _json(app.connection_manager.get_metrics())
+    
+    @app.before_serving
+    async def open_http_session():
+        # One pooled client session shared by all proxied requests
+        app.http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=1000, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=app.config['UPSTREAM_TIMEOUT']))
+    
+    @app.after_serving
+    async def close_http_session():
+        await app.http.close()
     
     @app.route('/proxy/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
     @require_connection
-    def proxy_request(path):
-        """sample of proxy endpoint"""
-        return jsonify({
-            'status': 'proxied',
-            'path': path,
-            'method': request.method,
-            'request_id': g.request_id,
-            'connection_id': g.conn_id
-        })
+    async def proxy_request(path):
+        """Forward the request to UPSTREAM_URL, or echo it back when unset"""
+        upstream = app.config['UPSTREAM_URL']
+        if not upstream:
+            return _json({
+                'status': 'proxied',
+                'path': path,
+                'method': request.method,
+                'request_id': g.request_id,
+                'connection_id': g.conn_id
+            })
+        
+        headers = [(k, v) for k, v in request.headers.items()
+                   if k.lower() not in REQUEST_SKIP_HEADERS]
+        headers.append(('X-Request-ID', g.request_id))
+        try:
+            async with app.http.request(
+                    request.method, f"{upstream.rstrip('/')}/{path}",
+                    params=list(request.args.items(multi=True)),
+                    headers=headers, data=(await request.get_data()) or None) as r:
+                body = await r.read()
+                response_headers = [(k, v) for k, v in r.headers.items()
+                                    if k.lower() not in RESPONSE_SKIP_HEADERS]
+                return Response(body, r.status, response_headers)
+        except asyncio.TimeoutError:
+            app.logger.warning(
+                'Upstream request timed out after %ss', app.config['UPSTREAM_TIMEOUT'],
+                extra={'request_id': g.request_id})
+            return _json({
+                'error': 'Gateway Timeout',
+                'request_id': g.request_id
+            }, 504)
+        except aiohttp.ClientError as e:
+            app.logger.warning(
+                'Upstream request failed: %s', e,
+                extra={'request_id': g.request_id})
+            return _json({
+                'error': 'Bad Gateway',
+                'request_id': g.request_id
+            }, 502)
 
     return app
 
 if __name__=='__main__':
-    app = create_app()
-    app.run(host='0.0.0.0', port=5000)
+    # uvloop and httptools keep the event loop and HTTP parsing in C. A single
+    # worker is used because connection limits, metrics and the log files are
+    # all owned by one process
+    uvicorn.run('app:create_app', factory=True, host='0.0.0.0', port=5000,
+                loop='uvloop', http='httptools', workers=1)
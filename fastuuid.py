@@ -0,0 +1,24 @@
+import os
+import threading
+
+# Random bytes are pulled from the OS in batches and handed out 16 at a time
+_BATCH_SIZE = 4096
+_UUID_SIZE = 16
+_UUID_TEMPLATE = '%s-%s-%s-%s-%s'
+
+_buf = threading.local()
+
+def new_uuid_str() -> str:
+    """Return a random (version 4) UUID string from a per-thread urandom batch"""
+    data = getattr(_buf, 'data', None)
+    pos = getattr(_buf, 'pos', _BATCH_SIZE)
+    if pos >= _BATCH_SIZE:
+        data = _buf.data = os.urandom(_BATCH_SIZE)
+        pos = 0
+    _buf.pos = pos + _UUID_SIZE
+
+    b = bytearray(data[pos:pos + _UUID_SIZE])
+    b[6] = (b[6] & 0x0f) | 0x40  # version 4
+    b[8] = (b[8] & 0x3f) | 0x80  # RFC 4122 variant
+    h = b.hex()
+    return _UUID_TEMPLATE % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter with UTF-8 mode off, where FileHandler stores
+# encoding='locale' rather than a codec name
+SCRIPT = '''
+import logging, sys
+sys.path.insert(0, {root!r})
+from app import FastRotatingFileHandler
+handler = FastRotatingFileHandler({path!r}, maxBytes=1000, backupCount=1)
+logger = logging.getLogger('fast-rotating-test')
+logger.addHandler(handler)
+logger.propagate = False
+logger.warning('ascii line')
+logger.warning('h\\u00e9llo w\\u00f6rld')
+handler.close()
+print(handler._bytes_written)
+'''
+
+class FastRotatingFileHandlerTest(unittest.TestCase):
+    def test_non_ascii_line_without_utf8_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.log')
+            env = dict(os.environ, PYTHONUTF8='0', LC_ALL='C.UTF-8')
+            result = subprocess.run(
+                [sys.executable, '-X', 'utf8=0', '-c',
+                 SCRIPT.format(root=ROOT, path=path)],
+                env=env, capture_output=True, text=True, check=True)
+
+            self.assertEqual(result.stderr, '')
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.assertEqual(data.decode('utf-8').splitlines(),
+                             ['ascii line', 'héllo wörld'])
+            self.assertEqual(int(result.stdout), len(data))
+
+if __name__ == '__main__':
+    unittest.main()